@@ -1,67 +1,28 @@
 from flask import Flask, request, jsonify
+from flask.json.provider import JSONProvider
 from flask_cors import CORS
-import swisseph as swe
-import datetime
-from typing import List, Union, Dict, Any
-from dateutil import parser, tz
+from typing import Dict, Any
+import math
+import orjson
+
+from ephem_core import (DEFAULT_PLANETS, PLANET_IDS, to_julian, format_lon, planet_data,
+                         planet_data_at, houses, find_hits)
 
 # -----------------------------------------------------------------------------
 # CONFIGURACIÓN
 # -----------------------------------------------------------------------------
-app = Flask(__name__)
-CORS(app)
+class OrjsonProvider(JSONProvider):
+    """Serializa las respuestas con orjson; jsonify lo usa sin más cambios."""
 
-swe.set_ephe_path("./ephe")
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY).decode()
 
-SIGNS = [
-    "ARIES", "TAURUS", "GEMINI", "CANCER", "LEO", "VIRGO",
-    "LIBRA", "SCORPIO", "SAGITTARIUS", "CAPRICORNUS", "AQUARIUS", "PISCES"
-]
-
-DEFAULT_PLANETS = [
-    "SUN", "MOON", "MERCURY", "VENUS", "MARS",
-    "JUPITER", "SATURN", "URANUS", "NEPTUNE", "PLUTO"
-]
-
-# -----------------------------------------------------------------------------
-# UTILIDADES
-# -----------------------------------------------------------------------------
+    def loads(self, s: Any, **kwargs: Any) -> Any:
+        return orjson.loads(s)
 
-def _to_julian(dt_iso: str) -> float:
-    dt = parser.isoparse(dt_iso)
-    if dt.tzinfo is None:
-        dt = dt.replace(tzinfo=tz.UTC)
-    dt_utc = dt.astimezone(tz.UTC)
-    return swe.julday(
-        dt_utc.year, dt_utc.month, dt_utc.day,
-        dt_utc.hour + dt_utc.minute / 60 + dt_utc.second / 3600
-    )
-
-def format_lon(lon: float) -> str:
-    sign_index = int(lon // 30)
-    sign = SIGNS[sign_index]
-    deg_in_sign = lon % 30
-    deg = int(deg_in_sign)
-    minutes = int((deg_in_sign - deg) * 60)
-    seconds = int(((deg_in_sign - deg) * 60 - minutes) * 60)
-    return f"{deg:02d}°{minutes:02d}′{seconds:02d}″ {sign}"
-
-def _planet_data(planet_name: str, dt_iso: str) -> Dict[str, Any]:
-    jd = _to_julian(dt_iso)
-    pl_id = getattr(swe, planet_name.upper(), None)
-    if pl_id is None:
-        raise ValueError(f"Planeta desconocido: {planet_name}")
-
-    (pl_pos, _flags) = swe.calc_ut(jd, pl_id)
-    lon, spd_lon = pl_pos[0] % 360, pl_pos[3]
-
-    return {
-        "planet": planet_name.upper(),
-        "longitude": lon,
-        "sign": SIGNS[int(lon // 30)],
-        "position": format_lon(lon),
-        "motion": "R" if spd_lon < 0 else "D",
-    }
+app = Flask(__name__)
+app.json = OrjsonProvider(app)
+CORS(app)
 
 # -----------------------------------------------------------------------------
 # ROUTES
@@ -78,7 +39,7 @@ def planet_position():
     if not planet or not dt_iso:
         return jsonify(error="Faltan parámetros: 'planet' y 'datetime' son obligatorios"), 400
     try:
-        return jsonify(_planet_data(planet, dt_iso))
+        return jsonify(planet_data(planet, dt_iso))
     except Exception as exc:
         return jsonify(error=str(exc)), 400
 
@@ -91,72 +52,35 @@ def aspect_hits():
     aspect_raw = data.get("aspect", 0)
     orb = float(data.get("orb", 0.05))
     jd_start_s, jd_end_s = data.get("jd_start"), data.get("jd_end")
-    step_hours = float(data.get("step_hours", 1))
-    natal_chart: Dict[str, float] = data.get("natal_chart", {})
+    step_hours = data.get("step_hours")
+    natal_chart: Dict[str, float] = data.get("natal_chart") or {}
 
     if not bodies:
         return jsonify(error="Debes especificar al menos un planeta en 'bodies'"), 400
     if target_raw is None or jd_start_s is None or jd_end_s is None:
         return jsonify(error="'target', 'jd_start' y 'jd_end' son obligatorios"), 400
+    if not isinstance(natal_chart, dict):
+        return jsonify(error="'natal_chart' debe ser un objeto"), 400
 
     targets = target_raw if isinstance(target_raw, list) else [target_raw]
     aspects = [float(a) for a in aspect_raw] if isinstance(aspect_raw, list) else [float(aspect_raw)]
 
-    jd_start = _to_julian(jd_start_s + "T00:00")
-    jd_end = _to_julian(jd_end_s + "T00:00")
-    step = step_hours / 24.0
-
-    hits: List[Dict[str, Any]] = []
-
-    for t in targets:
-        dyn_pl_id = None
-        if isinstance(t, (int, float)):
-            base_t_lon = float(t) % 360
-        elif isinstance(t, str):
-            if t.upper() in natal_chart:
-                base_t_lon = natal_chart[t.upper()] % 360
-            else:
-                dyn_pl_id = getattr(swe, t.upper(), None)
-                if dyn_pl_id is None:
-                    continue
-                base_t_lon = None
-        else:
-            continue
-
-        for body in bodies:
-            pl_id = getattr(swe, body.upper(), None)
-            if pl_id is None:
-                continue
-
-            jd_curr = jd_start
-            while jd_curr <= jd_end:
-                (pos_body, _flags) = swe.calc_ut(jd_curr, pl_id)
-                lon_body, spd_lon_body = pos_body[0] % 360, pos_body[3]
-
-                if dyn_pl_id is not None:
-                    (pos_target, _) = swe.calc_ut(jd_curr, dyn_pl_id)
-                    t_lon = pos_target[0] % 360
-                else:
-                    t_lon = base_t_lon
-
-                delta = (lon_body - t_lon + 360) % 360
-
-                for asp in aspects:
-                    diff = min(abs(delta - asp), 360 - abs(delta - asp))
-                    if diff <= orb:
-                        y, m, d, ut = swe.revjul(jd_curr)
-                        hr = int(ut)
-                        mi = int(round((ut - hr) * 60))
-                        ts = f"{y:04d}-{m:02d}-{d:02d}T{hr:02d}:{mi:02d}Z"
-                        hits.append({
-                            "planet": body.upper(),
-                            "utc": ts,
-                            "motion": "R" if spd_lon_body < 0 else "D",
-                        })
-                        break
-                jd_curr += step
-
-    hits.sort(key=lambda h: h["utc"])
+    jd_start = to_julian(jd_start_s + "T00:00")
+    jd_end = to_julian(jd_end_s + "T00:00")
+    step = None
+    if step_hours is not None:
+        try:
+            step_hours = float(step_hours)
+        except (TypeError, ValueError):
+            step_hours = float("nan")
+        if not math.isfinite(step_hours) or step_hours <= 0:
+            return jsonify(error="'step_hours' debe ser un número positivo"), 400
+        step = step_hours / 24.0
+
+    try:
+        hits = find_hits(bodies, targets, aspects, orb, jd_start, jd_end, step, natal_chart)
+    except ValueError as exc:
+        return jsonify(error=str(exc)), 400
     return jsonify(hits)
 
 @app.route("/chart", methods=["GET"])
@@ -167,14 +91,13 @@ def chart():
     if not dt_iso:
         return jsonify(error="Falta 'datetime'"), 400
 
-    jd = _to_julian(dt_iso)
+    jd = to_julian(dt_iso)
     chart = {}
     for p in DEFAULT_PLANETS:
-        chart[p] = _planet_data(p, dt_iso)
+        chart[p] = planet_data_at(p, PLANET_IDS[p], jd)
 
     # Cálculo de casas (Placidus)
-    hsys = b'P'
-    cusps, ascmc = swe.houses(jd, lat, lon, hsys)
+    cusps, ascmc = houses(jd, lat, lon)
     chart["houses"] = {f"House {i+1}": format_lon(cusps[i] % 360) for i in range(12)}
     chart["asc"] = format_lon(ascmc[0] % 360)
     chart["mc"] = format_lon(ascmc[1] % 360)
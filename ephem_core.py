@@ -0,0 +1,348 @@
+import swisseph as swe
+import numpy as np
+import datetime
+import threading
+from functools import lru_cache
+from typing import List, Tuple, Union, Dict, Any, Optional
+
+# -----------------------------------------------------------------------------
+# CONFIGURACIÓN
+# -----------------------------------------------------------------------------
+EPHE_PATH = "./ephe"
+
+# La Swiss Ephemeris guarda su estado (ruta, modos, cachés de ficheros) por
+# hilo, así que cada hilo que atiende peticiones debe configurarla una vez.
+_thread_state = threading.local()
+
+def _init_thread() -> None:
+    if not getattr(_thread_state, "ready", False):
+        swe.set_ephe_path(EPHE_PATH)
+        _thread_state.ready = True
+
+_init_thread()
+
+SIGNS = (
+    "ARIES", "TAURUS", "GEMINI", "CANCER", "LEO", "VIRGO",
+    "LIBRA", "SCORPIO", "SAGITTARIUS", "CAPRICORNUS", "AQUARIUS", "PISCES"
+)
+INV_30 = 1.0 / 30.0  # un signo son 30°; se multiplica en vez de dividir
+
+DEFAULT_PLANETS = [
+    "SUN", "MOON", "MERCURY", "VENUS", "MARS",
+    "JUPITER", "SATURN", "URANUS", "NEPTUNE", "PLUTO"
+]
+
+EXTRA_BODIES = [
+    "MEAN_NODE", "TRUE_NODE", "MEAN_APOG", "OSCU_APOG",
+    "CHIRON", "PHOLUS", "CERES", "PALLAS", "JUNO", "VESTA"
+]
+
+PLANET_IDS: Dict[str, int] = {name: getattr(swe, name) for name in DEFAULT_PLANETS + EXTRA_BODIES}
+
+# Velocidad media típica (°/día) de cada cuerpo.
+MEAN_MOTION = {
+    "MOON": 13.18, "MERCURY": 1.38, "VENUS": 1.2, "SUN": 0.9856, "MARS": 0.52,
+    "JUPITER": 0.083, "SATURN": 0.033, "URANUS": 0.012, "NEPTUNE": 0.006, "PLUTO": 0.004,
+}
+
+# Paso de muestreo (días) para acotar cruces de aspecto: lo que tarda cada
+# cuerpo en recorrer SAMPLE_ARC grados. Debe ser lo bastante corto para que
+# el residuo no cruce cero dos veces entre dos muestras; el orbe no influye
+# porque cada cruce se refina después por bisección.
+SAMPLE_ARC = 3.0
+MIN_STEP, MAX_STEP = 0.01, 8.0
+STEP_BY_BODY = {
+    name: min(max(SAMPLE_ARC / motion, MIN_STEP), MAX_STEP)
+    for name, motion in MEAN_MOTION.items()
+}
+DEFAULT_STEP = 1.0
+
+# Cota de la velocidad (°/día, en valor absoluto) de cada cuerpo, con margen
+# sobre el máximo de 1800-2200. Sirve para descartar tramos de la rejilla en
+# los que el residuo no puede llegar a cero; sin cota, no se descarta nada.
+MAX_SPEED = {
+    "MOON": 16.0, "MERCURY": 2.3, "VENUS": 1.3, "SUN": 1.05, "MARS": 0.83,
+    "JUPITER": 0.26, "SATURN": 0.14, "URANUS": 0.07, "NEPTUNE": 0.046, "PLUTO": 0.043,
+}
+SCREEN_FACTOR = 8  # muestras finas por tramo grueso
+BISECT_TOL = 1 / 86400  # 1 s
+MAX_ITER = 60
+
+# Efemérides suizas con velocidades: xx[3] da el movimiento diario en longitud.
+CALC_FLAGS = swe.FLG_SWIEPH | swe.FLG_SPEED
+
+J2000 = 2451545.0
+UNIX_EPOCH_JD = 2440587.5
+UNIX_EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+def _warm_up() -> None:
+    """Recorre una búsqueda completa al importar, no en la primera petición:
+    abre los ficheros de efemérides y ejercita los kernels y el formateo."""
+    find_hits(DEFAULT_PLANETS, [0.0, "SUN"], [0.0], 180.0, J2000, J2000 + 1)
+    # Con `gunicorn --preload` los workers heredan por fork los ficheros
+    # abiertos y compartirían su posición de lectura. Se cierran aquí y cada
+    # worker los reabre en su primera petición; su contenido sigue en la
+    # caché de páginas del sistema.
+    swe.close()
+    _thread_state.ready = False
+
+# -----------------------------------------------------------------------------
+# UTILIDADES
+# -----------------------------------------------------------------------------
+
+@lru_cache(maxsize=4096)
+def to_julian(dt_iso: str) -> float:
+    # fromisoformat está en C y, desde Python 3.11, acepta 'Z' y las formas
+    # reducidas (fecha sola, HH:MM); sin zona horaria se entiende UTC.
+    dt = datetime.datetime.fromisoformat(dt_iso)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=datetime.timezone.utc)
+    return UNIX_EPOCH_JD + (dt - UNIX_EPOCH) / datetime.timedelta(days=1)
+
+def format_utc(jds) -> List[str]:
+    """Instantes julianos como 'YYYY-MM-DDTHH:MMZ', redondeados al minuto."""
+    minutes = np.rint((np.asarray(jds, dtype=float) - UNIX_EPOCH_JD) * 1440).astype("int64")
+    return np.datetime_as_string(minutes.astype("datetime64[m]"), timezone="UTC").tolist()
+
+def _split_sign(lon: float) -> Tuple[int, float]:
+    """(índice de signo, grados dentro del signo) de una longitud en [0, 360]."""
+    sign_index = int(lon * INV_30)
+    if sign_index == 12:  # x % 360 da 360.0 para x negativo diminuto
+        return 0, 0.0
+    return sign_index, lon - sign_index * 30.0
+
+def format_lon(lon: float) -> str:
+    sign_index, deg_in_sign = _split_sign(lon)
+    sign = SIGNS[sign_index]
+    deg = int(deg_in_sign)
+    minutes = int((deg_in_sign - deg) * 60)
+    seconds = int(((deg_in_sign - deg) * 60 - minutes) * 60)
+    return f"{deg:02d}°{minutes:02d}′{seconds:02d}″ {sign}"
+
+@lru_cache(maxsize=8192)
+def _position(pl_id: int, jd: float) -> Tuple[float, float]:
+    """(longitud, velocidad en longitud) de un cuerpo en `jd`."""
+    _init_thread()
+    (pl_pos, _flags) = swe.calc_ut(jd, pl_id, CALC_FLAGS)
+    return pl_pos[0] % 360, pl_pos[3]
+
+def planet_data(planet_name: str, dt_iso: str) -> Dict[str, Any]:
+    pl_id = PLANET_IDS.get(planet_name.upper())
+    if pl_id is None:
+        raise ValueError(f"Planeta desconocido: {planet_name}")
+    return planet_data_at(planet_name.upper(), pl_id, to_julian(dt_iso))
+
+def planet_data_at(planet_name: str, pl_id: int, jd: float) -> Dict[str, Any]:
+    """Como planet_data, para un cuerpo ya resuelto y un instante juliano."""
+    lon, spd_lon = _position(pl_id, jd)
+
+    return {
+        "planet": planet_name,
+        "longitude": lon,
+        "sign": SIGNS[_split_sign(lon)[0]],
+        "position": format_lon(lon),
+        "motion": "R" if spd_lon < 0 else "D",
+    }
+
+@lru_cache(maxsize=1024)
+def _houses(jd: float, lat: float, lon: float, hsys: bytes):
+    _init_thread()
+    return swe.houses(jd, lat, lon, hsys)
+
+def houses(jd: float, lat: float, lon: float, hsys: bytes = b'P'):
+    """Cúspides de las casas y (ASC, MC, ...) para el sistema `hsys`.
+
+    Se cachea redondeando a ~0,1 s y ~10 m, lo que repiten las interfaces
+    que vuelven a pedir la misma carta.
+    """
+    return _houses(round(jd, 6), round(lat, 4), round(lon, 4), hsys)
+
+# -----------------------------------------------------------------------------
+# ASPECTOS
+# -----------------------------------------------------------------------------
+
+def _lons_at(cache: Dict[Any, np.ndarray], pl_id: int, jds: np.ndarray,
+             idx: np.ndarray) -> np.ndarray:
+    """Longitudes de `pl_id` sobre la rejilla `jds`, calculadas sólo en `idx`.
+
+    El resto queda en NaN hasta que se pida; cada muestra se calcula una sola
+    vez por petición.
+    """
+    key = (pl_id, len(jds))
+    if key not in cache:
+        cache[key] = np.full(len(jds), np.nan)
+    lons = cache[key]
+    todo = idx[np.isnan(lons[idx])]
+    when = jds[todo].tolist()
+    calc, flags = swe.calc_ut, CALC_FLAGS  # locales: el generador no busca globales
+    lons[todo] = np.fromiter((calc(jd, pl_id, flags)[0][0] for jd in when),
+                             dtype=float, count=len(when))
+    return lons
+
+def _separation(cache: Dict[Any, np.ndarray], pl_id: int, t_id: Union[int, None],
+                t_lon: float, asp_off: np.ndarray, jds: np.ndarray, idx: np.ndarray):
+    """Separación cuerpo-objetivo sobre la rejilla y offsets de aspecto que le
+    corresponden (ver _residual)."""
+    lons = _lons_at(cache, pl_id, jds, idx)
+    if t_id is not None:
+        return lons - _lons_at(cache, t_id, jds, idx), asp_off
+    return lons, (asp_off - t_lon) % 360
+
+def _residual(sep, off):
+    """Distancia con signo, en [-180, 180), de la separación `sep` al aspecto.
+
+    `off` es el ángulo de aspecto ya envuelto, (180 - aspecto) % 360; para un
+    objetivo fijo se le resta también su longitud y `sep` es la del cuerpo.
+    """
+    return (sep + off) % 360 - 180
+
+def _crossings(sep: np.ndarray, offsets: np.ndarray):
+    """Índices (muestra, aspecto) donde el residuo cambia de signo entre una
+    muestra y la siguiente, junto con la matriz de residuos."""
+    r = _residual(sep[:, None], offsets)
+    # Se compara el signo y no el producto: un residuo exactamente 0 en una
+    # muestra seguía dando producto nulo a ambos lados y el cruce se perdía.
+    # El salto de +180 a -180 al dar la vuelta no es un cruce.
+    neg = r < 0
+    cross = (neg[:-1] != neg[1:]) & (np.abs(r[1:] - r[:-1]) < 180)
+    return np.nonzero(cross), r
+
+def _screen(sep: np.ndarray, off: np.ndarray, jds: np.ndarray,
+            coarse: np.ndarray, speed: float) -> np.ndarray:
+    """Índices de la rejilla que hay que muestrear: los de los tramos gruesos en
+    los que algún residuo podría llegar a cero moviéndose a `speed` °/día."""
+    r = np.abs(_residual(sep[coarse][:, None], off))
+    reach = speed * np.diff(jds[coarse])
+    maybe = ((r[:-1] + r[1:]) <= reach[:, None]).any(axis=1)
+    fine = np.zeros(len(jds), dtype=bool)
+    for c in np.flatnonzero(maybe):
+        fine[coarse[c]:coarse[c + 1] + 1] = True
+    return np.flatnonzero(fine)
+
+def _bisect(pl_id: int, t_id: Union[int, None], off: float,
+            lo: float, hi: float, r_lo: float, r_hi: float):
+    """Refina un cruce de aspecto acotado en [lo, hi] por falsa posición
+    (variante Illinois): conserva el cambio de signo como la bisección pero
+    converge en muchas menos evaluaciones.
+
+    Devuelve (jd, residuo, velocidad del cuerpo) en el extremo más cercano al
+    cruce; la velocidad sale de la última evaluación, sin recalcularla.
+    """
+    calc, flags = swe.calc_ut, CALC_FLAGS
+    spd_lo = spd_hi = None
+    f_lo, f_hi = r_lo, r_hi  # residuos de interpolación (Illinois los divide)
+    side = 0
+    for _ in range(MAX_ITER):
+        if hi - lo <= BISECT_TOL:
+            break
+        mid = hi - f_hi * (hi - lo) / (f_hi - f_lo)
+        if not lo < mid < hi:
+            mid = (lo + hi) / 2
+        pos = calc(mid, pl_id, flags)[0]
+        sep = pos[0]
+        if t_id is not None:
+            sep -= calc(mid, t_id, flags)[0][0]
+        r_mid = _residual(sep, off)
+        if r_mid == 0:
+            return mid, r_mid, pos[3]
+        if (r_mid < 0) == (r_lo < 0):
+            lo, r_lo, f_lo, spd_lo = mid, r_mid, r_mid, pos[3]
+            if side == -1:
+                f_hi /= 2
+            side = -1
+        else:
+            hi, r_hi, f_hi, spd_hi = mid, r_mid, r_mid, pos[3]
+            if side == 1:
+                f_lo /= 2
+            side = 1
+    if abs(r_lo) < abs(r_hi):
+        jd, r, spd = lo, r_lo, spd_lo
+    else:
+        jd, r, spd = hi, r_hi, spd_hi
+    if spd is None:
+        spd = calc(jd, pl_id, flags)[0][3]
+    return jd, r, spd
+
+def find_hits(bodies: List[str], targets: List[Any], aspects: List[float], orb: float,
+              jd_start: float, jd_end: float, step: Optional[float] = None,
+              natal_chart: Optional[Dict[str, float]] = None) -> List[Dict[str, Any]]:
+    """Momentos en que cada cuerpo forma alguno de los aspectos con cada objetivo.
+
+    Los objetivos pueden ser longitudes, claves de `natal_chart` o nombres de
+    cuerpos (objetivos móviles). `step` fija el paso de muestreo en días; si
+    se omite, se usa el de STEP_BY_BODY.
+    """
+    _init_thread()
+    natal_up = {k.upper(): v for k, v in (natal_chart or {}).items()}
+    # Un aspecto repetido (90 y 90, 0 y 360) daría aciertos duplicados.
+    asp_off = np.unique((180.0 - np.asarray(aspects, dtype=float)) % 360)
+    bodies_up = [b.upper() for b in bodies]
+    body_ids = [(b, PLANET_IDS[b]) for b in bodies_up if b in PLANET_IDS]
+
+    # Objetivos resueltos una vez:
+    # (id dinámico, longitud fija, paso máximo, cota de velocidad).
+    target_specs = []
+    for t in targets:
+        if isinstance(t, str):
+            try:
+                t = float(t)  # longitudes enviadas como texto: "-45.5", "1e2"
+            except ValueError:
+                pass
+        if isinstance(t, (int, float)):
+            target_specs.append((None, float(t) % 360, float("inf"), 0.0))
+        elif isinstance(t, str):
+            t_up = t.upper()
+            if t_up in natal_up:
+                # Sólo se convierten los valores natales que se usan como objetivo.
+                try:
+                    natal_lon = float(natal_up[t_up]) % 360
+                except (TypeError, ValueError):
+                    raise ValueError(f"Longitud natal no numérica para '{t}'") from None
+                target_specs.append((None, natal_lon, float("inf"), 0.0))
+            elif t_up in PLANET_IDS:
+                target_specs.append((PLANET_IDS[t_up], 0.0,
+                                     STEP_BY_BODY.get(t_up, DEFAULT_STEP),
+                                     MAX_SPEED.get(t_up, float("inf"))))
+
+    # Aciertos por columnas; los registros se construyen al final.
+    hit_bodies: List[str] = []
+    hit_jds: List[float] = []
+    hit_spds: List[float] = []
+    samples: Dict[Any, np.ndarray] = {}
+
+    for body, pl_id in body_ids:
+        for t_id, t_lon, t_step, t_speed in target_specs:
+            if t_id == pl_id:
+                continue  # separación de un cuerpo consigo mismo: siempre 0, sin cruces
+            body_step = step or min(STEP_BY_BODY.get(body, DEFAULT_STEP), t_step)
+            n_steps = max(int(np.ceil((jd_end - jd_start) / body_step)), 0)
+            jds = np.linspace(jd_start, jd_end, n_steps + 1)
+
+            # Primero una rejilla gruesa; sólo se muestrean a paso fino los
+            # tramos en los que la velocidad relativa permite un cruce.
+            coarse = np.unique(np.r_[np.arange(0, len(jds), SCREEN_FACTOR), len(jds) - 1])
+            speed = MAX_SPEED.get(body, float("inf")) + t_speed
+            sep, off = _separation(samples, pl_id, t_id, t_lon, asp_off, jds, coarse)
+            fine = _screen(sep, off, jds, coarse, speed)
+            sep, off = _separation(samples, pl_id, t_id, t_lon, asp_off, jds, fine)
+            (idx, asp_idx), r = _crossings(sep, off)
+            for i, k in zip(idx.tolist(), asp_idx.tolist()):
+                jd_hit, r_hit, spd_lon_body = _bisect(pl_id, t_id, off[k],
+                                                      jds[i], jds[i + 1], r[i, k], r[i + 1, k])
+                if abs(r_hit) <= orb:
+                    hit_bodies.append(body)
+                    hit_jds.append(jd_hit)
+                    hit_spds.append(spd_lon_body)
+
+    stamps = format_utc(hit_jds)
+    motions = np.where(np.asarray(hit_spds) < 0, "R", "D").tolist()
+    # Orden cronológico sobre la columna de instantes; estable, así que los
+    # empates conservan el orden de cuerpos y objetivos de la petición.
+    order = np.argsort(np.asarray(hit_jds, dtype=float), kind="stable").tolist()
+    return [
+        {"planet": hit_bodies[j], "utc": stamps[j], "motion": motions[j]}
+        for j in order
+    ]
+
+# -----------------------------------------------------------------------------
+_warm_up()